@@ -11,6 +11,11 @@
 
 from __future__ import absolute_import
 
+from romsviz.catalog import *
+from romsviz.grid import *
 from romsviz.ncout import *
 from romsviz.outvar import *
+from romsviz.readplan import *
+from romsviz.stats import *
+from romsviz.zslice import *
 from romsviz.romsviz import *
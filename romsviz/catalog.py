@@ -0,0 +1,115 @@
+import os
+import logging
+import numpy as np
+import netCDF4
+
+class VarSchema(object):
+    """Class describing a netcdf variable without holding the file open. Like for a
+    netCDF4.Variable, the netcdf attributes (units, long_name, ...) of the variable
+    can be accessed as instance attributes, which is why instances are also used as
+    OutVar.meta."""
+    def __init__(self, nc_var):
+        """
+        Constructor copying the schema of an open variable.
+
+        Args:
+            nc_var (netCDF4.Variable) : Variable to describe
+        """
+        self.name = str(nc_var.name)
+        self.dimensions = tuple(str(d) for d in nc_var.dimensions)
+        self.shape = tuple(nc_var.shape)
+        self.dtype = nc_var.dtype
+        self.chunking = nc_var.chunking()
+        self.filters = nc_var.filters()
+        self.attrs = {k: nc_var.getncattr(k) for k in nc_var.ncattrs()}
+
+    def __getattr__(self, attr):
+        """Method giving netcdf attributes of the variable as instance attributes."""
+        try:
+            return self.__dict__["attrs"][attr]
+        except KeyError:
+            raise AttributeError("{} has no attribute {}".format(self.__dict__.get("name"), attr))
+
+class SchemaCatalog(object):
+    """Class holding the schema (dimensions, and dims, shapes, dtypes, attributes and
+    chunking of all variables) of a dataset of one or more netcdf files, together with
+    the number of time entries in each file and the full time array. Everything is
+    collected in one scan of the files. Catalogs are shared through get(), so all
+    NetcdfOut instances (e.g. a RomsViz and its grid file) on the same unchanged files
+    use the same catalog instead of reopening files for metadata.
+    """
+    catalogs = dict()
+
+    @classmethod
+    def get(cls, filepaths):
+        """
+        Method that gives the (shared) catalog of a list of files, building it
+        if the files have not been scanned before or have changed since.
+
+        Args:
+            filepaths (list(str)) : List of netcdf files making up the dataset
+        Returns:
+            catalog (SchemaCatalog) : Catalog of the dataset
+        """
+        key = tuple((fn, os.path.getmtime(fn), os.path.getsize(fn)) for fn in filepaths)
+
+        if key not in cls.catalogs:
+            cls.catalogs[key] = cls(filepaths)
+
+        return cls.catalogs[key]
+
+    def __init__(self, filepaths):
+        """
+        Constructor that scans the files. The schema is taken from the first
+        file, and the time dimension (if any) from all files.
+
+        Args:
+            filepaths (list(str)) : List of netcdf files making up the dataset
+        """
+        logging.debug("building schema catalog of {} file(s)".format(len(filepaths)))
+        self.filepaths = list(filepaths)
+        self.time_name = None
+        self.time = None
+        self.t_per_file = list()
+
+        with netCDF4.Dataset(self.filepaths[0], mode="r") as ds:
+            self.dims = {str(k): d.size for k, d in ds.dimensions.items()}
+            self.variables = {str(k): VarSchema(v) for k, v in ds.variables.items()}
+
+            for dim_name, dim in ds.dimensions.items():
+                if dim.isunlimited():
+                    self.time_name = str(dim_name)
+                    break
+
+        if self.time_name is not None:
+            self._scan_time()
+
+    def _scan_time(self):
+        """Method that reads the length and values of the time variable in all files."""
+        t_dates = list()
+
+        for fn in self.filepaths:
+            with netCDF4.Dataset(fn, mode="r") as ds:
+                self.t_per_file.append(ds.dimensions[self.time_name].size)
+
+                if self.time_name in ds.variables:
+                    t_raw = ds.variables[self.time_name]
+                    t_dates.append(netCDF4.num2date(t_raw[:], t_raw.units, only_use_cftime_datetimes=False,
+                                                    only_use_python_datetimes=True))
+
+        if t_dates:
+            self.time = np.array(np.concatenate(t_dates, axis=0), dtype="datetime64[us]")
+
+    def get_var(self, var_name):
+        """
+        Method that gives the schema of a variable.
+
+        Args:
+            var_name (str) : Name of variable
+        Returns:
+            schema (VarSchema) : Schema of the variable
+        """
+        if var_name not in self.variables:
+            raise ValueError("Invalid variable {}!".format(var_name))
+
+        return self.variables[var_name]
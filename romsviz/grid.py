@@ -0,0 +1,155 @@
+import logging
+import numpy as np
+from . import outvar
+from . import zslice
+
+class RomsGrid(object):
+    """Class holding the horizontal ROMS grid in memory: lon/lat and land masks for each
+    staggering (rho, u, v, psi) and the metrics pm, pn, h (also averaged to u- and
+    v-points as e.g. pm_u, h_v), angle and f. Everything is read once, so plotting
+    and extraction methods slice the cached (read-only) arrays instead of reading the
+    file again. Masks are stored as boolean arrays (True for water).
+    """
+    staggers = ["rho", "u", "v", "psi"]
+    metrics = ["pm", "pn", "h", "angle", "f"]
+
+    def __init__(self, ncout):
+        """
+        Constructor that reads all grid fields present in the dataset.
+
+        Args:
+            ncout (NetcdfOut) : Instance of the grid file (or any file with the grid)
+        """
+        self.ncout = ncout
+        self.fields = dict()
+        self.dims = dict()
+
+        for stagger in self.staggers:
+            for name in ["lon", "lat", "mask"]:
+                self._load("{}_{}".format(name, stagger))
+
+        for name in self.metrics:
+            self._load(name)
+
+        for stagger in ["u", "v"]:
+            dims = ("eta_{}".format(stagger), "xi_{}".format(stagger))
+
+            for name in ["pm", "pn", "h"]:
+                if name in self.fields:
+                    self._store("{}_{}".format(name, stagger), dims,
+                                zslice.to_stagger(self.fields[name], stagger))
+
+    def _load(self, name):
+        """Method that reads a 2D grid field (if present) into the cache."""
+        if name not in self.ncout.catalog.variables:
+            return
+
+        dims = self.ncout.catalog.get_var(name).dimensions
+        data = self.ncout.get_var(name, masked=False).data
+
+        if name.startswith("mask"):
+            data = data == 1
+
+        logging.debug("caching grid field {} {}".format(name, data.shape))
+        self._store(name, dims, data)
+
+    def _store(self, name, dims, data):
+        """Method that stores a field as a read-only array with its dimension names."""
+        data = np.ascontiguousarray(data)
+        data.flags.writeable = False  # views are handed out, protect the cache
+        self.fields[name] = data
+        self.dims[name] = tuple(dims)
+
+    def get_var(self, name, **limits):
+        """
+        Method that slices a cached grid field, with the same limits
+        as NetcdfOut.get_var(), without any file access.
+
+        Args:
+            name (str)          : Name of grid field, e.g. "lon_rho" or "pm_u"
+            limits (str: tuple) : Index limits for the dimensions of the field
+        Returns:
+            var (OutVar) : Variable with a (read-only) view of the cached field
+        """
+        if name not in self.fields:
+            raise ValueError("Invalid grid field {}!".format(name))
+
+        var = outvar.OutVar()
+        var.name = name
+        var.dim_names = self.dims[name]
+        self.ncout._verify_kwargs(name, var.dim_names, **limits)
+        var.bounds = np.array(self.fields[name].shape, dtype=np.int64)
+        lims = self.ncout._get_dim_lims(var.dim_names, **limits)
+        self.ncout._verify_lims(lims, var.bounds, var.dim_names)
+        var.lims = self.ncout._fill_lims(lims, var.bounds)
+        var.data = self.fields[name][self.ncout._lims_to_slices(var.lims)].squeeze()
+
+        if name in self.ncout.catalog.variables:
+            var.meta = self.ncout.catalog.get_var(name)
+
+        return var
+
+    def get_stagger(self, dim_names):
+        """
+        Method that finds the staggering of a variable from its last dimension.
+
+        Args:
+            dim_names (list) : Dimension names of the variable
+        Returns:
+            stagger (str) : One of self.staggers (None if not on the grid)
+        """
+        stagger = dim_names[-1].split("_")[-1] if dim_names else None
+        return stagger if stagger in self.staggers else None
+
+    def land_mask(self, var):
+        """
+        Method that gives the land mask of the extracted window of a variable,
+        shaped to broadcast against its (squeezed) data array.
+
+        Args:
+            var (OutVar) : Extracted variable (with filled lims)
+        Returns:
+            land (ndarray) : Boolean array (True for land), None if no mask exists
+        """
+        mask_name = "mask_{}".format(self.get_stagger(var.dim_names))
+
+        if mask_name not in self.fields or tuple(var.dim_names[-2:]) != self.dims[mask_name]:
+            return None
+
+        lengths = [l_2 - l_1 + 1 for l_1, l_2 in var.lims]
+
+        if var.time_name in var.dim_names and var.t_indices is not None:
+            lengths[var.dim_names.index(var.time_name)] = len(var.t_indices)  # files may be skipped
+
+        slices = self.ncout._lims_to_slices(var.lims[-2:])
+        land = ~self.fields[mask_name][slices]
+
+        # insert length one axes for the other dims, drop the ones squeezed from the data
+        shape = [1 for _ in lengths[:-2]] + list(land.shape)
+        keep = [n for n, length in zip(shape, lengths) if length != 1]
+        return land.reshape(keep)
+
+    def apply_mask(self, var):
+        """
+        Method that sets land points of a variable to NaN (or masked) in place.
+
+        Args:
+            var (OutVar) : Extracted variable with float or masked data
+        Returns:
+            var (OutVar) : The same variable
+        """
+        land = self.land_mask(var)
+
+        if land is None:
+            return var
+
+        land = np.broadcast_to(land, var.data.shape)
+
+        if np.ma.isMaskedArray(var.data):
+            var.data[land] = np.ma.masked
+        elif np.issubdtype(var.data.dtype, np.floating):
+            np.copyto(var.data, np.nan, where=land)
+        else:
+            raise TypeError("Can not set land to NaN for dtype {}".format(var.data.dtype))
+
+        return var
@@ -10,12 +10,16 @@
 import os
 import sys
 import glob
+import tempfile
 import logging
 import collections
 import datetime as dt
 import numpy as np
 import netCDF4
 from . import outvar
+from . import catalog
+from . import readplan
+from . import stats
 
 class NetcdfOut(object):
     """Class docstring...
@@ -45,8 +49,13 @@ class NetcdfOut(object):
 
         self.filename = filename
         self.filepaths = self.generate_filepaths()
+        self.catalog = catalog.SchemaCatalog.get(self.filepaths)
         self.time_name = self._get_unlimited_dim()
         self.default_lim = (None, None)
+        self.chunk_cache_budget = 64 * 1024**2  # bytes of chunk cache per variable read
+        self.stats = None
+        self.memory_budget = None  # max bytes of a get_var() result, None for no limit
+        self.memmap_dir = None     # directory for disk-backed results above memory_budget
 
     def generate_filepaths(self):
         """
@@ -81,14 +90,9 @@ class NetcdfOut(object):
             dim_name (str)          : Name of unlimited dimension
             dim (netCDF4.Dimension) : Dimension object for unlimtied dim
         """
-        with netCDF4.Dataset(self.filepaths[0], mode="r") as ds:
-            for dim_name, dim in ds.dimensions.items():
-                if dim.isunlimited():
-                    return str(dim_name)
+        return self.catalog.time_name
 
-        return None
-
-    def get_var(self, var_name, **limits):
+    def get_var(self, var_name, masked=True, dtype=None, value_range=None, **limits):
         """
         Method that supervises the fetching of data from a certain netcdf output
         variable. User may define index limits for all dimensions (or only some of
@@ -97,6 +101,15 @@ class NetcdfOut(object):
 
         Args:
             var_name (str)      : Name of variable to be extracted
+            masked (bool)       : True (default) gives a masked array like netCDF4 does,
+                                  False gives a plain ndarray with NaN at fill values
+                                  (avoids carrying a boolean mask of the same size)
+            dtype (np.dtype)    : Optional output dtype, e.g. np.float32 to halve the
+                                  memory of double precision fields
+            value_range (tuple) : Optional (vmin, vmax), None meaning unbounded. Files
+                                  where (according to self.stats) no value of the variable
+                                  is inside the range are skipped (time axis shrinks, var.lims
+                                  still describe the request and var.t_indices the steps kept)
             limits (str: tuple) : Lower- and upper index limits for a dimension to
                                   the variable. Min index is 0 and max index is the
                                   size of the particular dimension. Limits for a
@@ -111,27 +124,19 @@ class NetcdfOut(object):
         logging.debug("extracting variable {}".format(var_name))
         logging.debug("user supplied dimension limits: {}".format(limits))
 
-        # store info in OutVar object and verify user inputed dimension limits
-        var = outvar.OutVar()
-        var.name = var_name
-        var.dim_names = self._get_var_attr(self.filepaths[0], var_name, "dimensions")
-        self._verify_kwargs(var.name, var.dim_names, **limits)
-        var.lims = self._get_dim_lims(var.dim_names, **limits)
-        var.bounds = list(self._get_var_attr(self.filepaths[0], var_name, "shape"))
+        self._verify_dtype(masked, dtype)
+        var, shape = self._plan_var(var_name, value_range, **limits)
+        data = self._alloc_data(var.name, shape, masked, dtype)
+        masked = np.ma.isMaskedArray(data)  # a disk-backed result is never masked
 
         # the time dimension may span over multiple files
         if self.time_name in var.dim_names:
-            self.set_time_array()
             t_idx = var.dim_names.index(self.time_name)
-            var.bounds[t_idx] = self._get_num_time_entries()
-            var.lims[t_idx] = self._get_time_lims(var.lims[t_idx], var.bounds[t_idx])
-            self._verify_lims(var.lims, var.bounds, var.dim_names)
-            var.use_files, var.t_dist = self._compute_time_dist(*var.lims[t_idx])
-
-            data_list = list()
+            region = [slice(None) for _ in var.dim_names]
             lims = var.lims[:]
+            t_offset = 0
 
-            # loop through the all data sets and extract data if inside time limits
+            # loop through the all data sets and read data directly into its time region
             for i, fn in enumerate(self.filepaths):
                 if var.use_files[i]:
                     lims[t_idx] = var.t_dist[i]
@@ -139,39 +144,110 @@ class NetcdfOut(object):
                     logging.debug("getting data from file {} with slices {}".format(fn, slices))
 
                     with netCDF4.Dataset(fn, mode="r") as ds:
-                        data_list.append(self._get_var_nd(var.name, slices, ds))
+                        t_length = len(range(*slices[t_idx].indices(ds.dimensions[self.time_name].size)))
+                        region[t_idx] = slice(t_offset, t_offset + t_length)
+                        part = data[tuple(region)]
+                        self._read_var_nd(var.name, slices, ds, part, masked)
+                        t_offset += t_length
 
-            # concatenate data from (possibly) multiple files along time axis
-            data = np.concatenate(data_list, axis=t_idx)
-            var.time = self.time[self._lims_to_slices([var.lims[t_idx]])]  # include time slice
+                    # data has no mask until some value is masked, and a mask created on a view is not shared
+                    if masked and np.ma.getmask(data) is np.ma.nomask and np.ma.is_masked(part):
+                        data.mask = False
+                        data.mask[tuple(region)] = part.mask
 
         # very simple if there's no time dimension
         else:
-            self._verify_lims(var.lims, var.bounds, var.dim_names)
             slices = self._lims_to_slices(var.lims)
 
             with netCDF4.Dataset(self.filepaths[0], mode="r") as ds:
-                data = self._get_var_nd(var.name, slices, ds)  # use e.g. zeroth dataset
+                self._read_var_nd(var.name, slices, ds, data, masked)  # use e.g. zeroth dataset
 
         var.data = data.squeeze()  # finally store the main array in var object
+        var.lims = self._fill_lims(var.lims, var.bounds)
+        var.bounds = np.array(var.bounds, dtype=np.int64)
         return var
 
-    def _get_var_attr(self, filename, var_name, attr):
+    def estimate_var(self, var_name, masked=True, dtype=None, value_range=None, **limits):
+        """
+        Method that gives the size of what self.get_var() would return with the
+        same arguments, without reading any data (dry-run).
+
+        Args:
+            See self.get_var()
+        Returns:
+            plan (dict) : With keys "shape" (before squeeze), "dtype", "nbytes" (incl.
+                          mask if masked), "files" (list of files to read from) and
+                          "within_budget" (False if above self.memory_budget)
+        """
+        self._verify_dtype(masked, dtype)
+        var, shape = self._plan_var(var_name, value_range, **limits)
+        dtype = self._result_dtype(var_name, masked, dtype)
+        nbytes = self._result_nbytes(shape, dtype, masked)
+
+        if var.use_files is None:
+            files = self.filepaths[:1]
+        else:
+            files = [fn for fn, use in zip(self.filepaths, var.use_files) if use]
+
+        within_budget = self.memory_budget is None or nbytes <= self.memory_budget
+        return dict(shape=tuple(shape), dtype=dtype, nbytes=nbytes, files=files, within_budget=within_budget)
+
+    def _plan_var(self, var_name, value_range=None, **limits):
+        """
+        Method that verifies the user inputed limits for a variable and works
+        out what to read from where, without reading any data.
+
+        Args:
+            See self.get_var()
+        Returns:
+            var (OutVar) : Variable with all info except the data array
+            shape (list) : Shape of the data array to read (before squeeze)
+        """
+        # store info in OutVar object and verify user inputed dimension limits
+        var = outvar.OutVar()
+        var.name = var_name
+        var.time_name = self.time_name
+        var.meta = self.catalog.get_var(var_name)
+        var.dim_names = var.meta.dimensions
+        self._verify_kwargs(var.name, var.dim_names, **limits)
+        var.lims = self._get_dim_lims(var.dim_names, **limits)
+        var.bounds = list(var.meta.shape)
+
+        # the time dimension may span over multiple files
+        if self.time_name in var.dim_names:
+            self.set_time_array()
+            t_idx = var.dim_names.index(self.time_name)
+            var.bounds[t_idx] = self._get_num_time_entries()
+            var.lims[t_idx] = self._get_time_lims(var.lims[t_idx], var.bounds[t_idx])
+            self._verify_lims(var.lims, var.bounds, var.dim_names)
+            var.use_files, var.t_dist = self._compute_time_dist(*var.lims[t_idx])
+
+            if value_range is not None:
+                var.use_files = self._skip_files(var.name, var.use_files, var.t_dist, value_range)
+
+            t_indices = self._get_time_indices(var.use_files, var.t_dist)
+            shape = self._lims_to_shape(var.lims, var.bounds)
+            shape[t_idx] = len(t_indices)
+            var.t_indices = t_indices  # the time steps extracted (files may be skipped)
+            var.time = self.time[t_indices]  # include time of the files used
+
+        else:
+            self._verify_lims(var.lims, var.bounds, var.dim_names)
+            shape = self._lims_to_shape(var.lims, var.bounds)
+
+        return var, shape
+
+    def _get_var_attr(self, var_name, attr):
         """
-        Method that gives an attribute for a variable in a netcdf file.
+        Method that gives an attribute for a variable from the schema catalog.
 
         Args:
-            filename (str)    : Name of file with variable
             var_name (string) : Name of variable
             attr (str)        : Name of attribute to get
         Returns:
             attr (some type) : The requested attribute if it exists
         """
-        with netCDF4.Dataset(filename, mode="r") as ds:
-            if var_name not in ds.variables.keys():
-                raise ValueError("Invalid variable {}!".format(var_name))
-
-            return getattr(ds.variables[var_name], attr)
+        return getattr(self.catalog.get_var(var_name), attr)
 
     def _get_dim_lims(self, vd_names, **limits):
         """
@@ -204,6 +280,34 @@ class NetcdfOut(object):
 
         return idx_lims
 
+    def _fill_lims(self, lims, bounds):
+        """
+        Method that replaces default (None) limits by the actual index range
+        and gives the limits as an integer array.
+
+        Args:
+            lims (list)   : List of tuples with index limits
+            bounds (list) : List of upper index bounds
+        Returns:
+            lims (ndarray) : Array of shape (num_dims, 2) with index limits
+        """
+        filled = [(0 if l_1 is None else l_1, length - 1 if l_2 is None else l_2)
+                  for (l_1, l_2), length in zip(lims, bounds)]
+        return np.array(filled, dtype=np.int64).reshape(-1, 2)
+
+    def _verify_dtype(self, masked, dtype):
+        """
+        Method that raises error if a user requested dtype can not hold the
+        result, i.e. a non-float dtype when fill values are to become NaN.
+
+        Args:
+            masked (bool)    : False if fill values are to become NaN
+            dtype (np.dtype) : User requested dtype (or None)
+        """
+        if dtype is not None and not masked and not np.issubdtype(np.dtype(dtype), np.floating):
+            raise ValueError("masked=False fills with NaN and needs a floating dtype, got {}!".format(
+                             np.dtype(dtype)))
+
     def _verify_kwargs(self, var_name, vd_names, **limits):
         """
         Method that raises error if not all dimension names
@@ -248,29 +352,25 @@ class NetcdfOut(object):
         Returns:
             num_time_entries (int) : Number of time elements across all input files
         """
-        time_length = 0
+        return sum(self._get_time_per_file())
 
-        for fn in self.filepaths:
-            with netCDF4.Dataset(fn, mode="r") as ds:
-                time_length += ds.variables[self.time_name].shape[0]
+    def _get_time_per_file(self):
+        """
+        Method that counts the number of time entries in each file.
 
-        return time_length
+        Returns:
+            t_per_file (list(int)) : Number of time elements for each input file
+        """
+        return list(self.catalog.t_per_file)
 
     def set_time_array(self):
         """
-        Method that stitches together the time array over all files.
+        Method that sets the time array over all files (from the schema catalog).
 
         Returns:
-            t_dates (np.ndarray (1D)) : Full time array across all files
+            t_dates (np.ndarray (1D)) : Full datetime64 time array across all files
         """
-        t_dates = list()
-
-        for fn in self.filepaths:
-            with netCDF4.Dataset(fn, mode="r") as ds:
-                t_raw = ds.variables[self.time_name]
-                t_dates.append(netCDF4.num2date(t_raw[:], t_raw.units))
-
-        self.time = np.concatenate(t_dates, axis=0)
+        self.time = self.catalog.time
 
     def _get_time_lims(self, t_lim, total_length):
         """
@@ -289,7 +389,7 @@ class NetcdfOut(object):
         elif type(t_lim[0]) in int_types or type(t_lim[1]) in int_types:
             return t_lim
 
-        elif type(t_lim[0]) is dt.datetime:
+        elif type(t_lim[0]) in [dt.datetime, np.datetime64]:
             idx_start = self._idx_from_date(t_lim[0])
             idx_stop = self._idx_from_date(t_lim[1])
             return (idx_start, idx_stop)
@@ -323,12 +423,7 @@ class NetcdfOut(object):
             idx_start (int) : Starting index of total time slice
             idx_stop (int)  : Stop index of total time slice
         """
-        t_per_file = list()
-
-        for fn in self.filepaths:
-            with netCDF4.Dataset(fn, mode="r") as ds:
-                t_per_file.append(ds.variables[self.time_name].shape[0])
-
+        t_per_file = self._get_time_per_file()
         use_files = [False for _ in t_per_file]  # bool values for relevant files
         idx_total = 0       # to count total indices over all files
 
@@ -383,17 +478,308 @@ class NetcdfOut(object):
 
         return tuple(slices)
 
-    def _get_var_nd(self, var_name, slices, dataset):
+    def _lims_to_shape(self, lims, bounds):
+        """
+        Method that computes the shape of the array covered by a list of index limits.
+
+        Args:
+            lims (list)   : List of tuples with index limits for each dimension
+            bounds (list) : List of upper index bounds
+        Returns:
+            shape (list) : Length of each dimension within the limits
+        """
+        slices = self._lims_to_slices(lims)
+        return [len(range(*s.indices(b))) for s, b in zip(slices, bounds)]
+
+    def _get_time_indices(self, use_files, t_dist):
+        """
+        Method that converts the time distribution over files to indices into the
+        full time array (across files), only including the files in use.
+
+        Args:
+            use_files (list) : Bool values telling which files to extract from
+            t_dist (tuple)   : Start- and stop index within each file
+        Returns:
+            t_indices (ndarray) : Indices into self.time
+        """
+        t_per_file = self._get_time_per_file()
+        t_offsets = np.cumsum([0] + t_per_file[:-1])
+        t_indices = [np.array([], dtype=int)]
+
+        for i in range(len(self.filepaths)):
+            if use_files[i]:
+                t_slice = self._lims_to_slices([t_dist[i]])[0]
+                t_indices.append(t_offsets[i] + np.arange(*t_slice.indices(t_per_file[i])))
+
+        return np.concatenate(t_indices)
+
+    def _skip_files(self, var_name, use_files, t_dist, value_range):
+        """
+        Method that marks files as unused if the statistics in self.stats tell
+        that no value of the variable within the time limits is inside a range.
+
+        Args:
+            var_name (str)      : Name of variable
+            use_files (list)    : Bool values telling which files to extract from
+            t_dist (tuple)      : Start- and stop index within each file
+            value_range (tuple) : (vmin, vmax) where None means unbounded
+        Returns:
+            use_files (list) : Updated copy of use_files
+        """
+        if self.stats is None or not self.stats.has_var(var_name):
+            raise ValueError("value_range needs stats for {}, use build_stats()!".format(var_name))
+
+        use_files = use_files[:]
+
+        for i, fn in enumerate(self.filepaths):
+            if use_files[i] and not self.stats.can_match(var_name, i, t_dist[i], value_range):
+                logging.debug("skipping file {} (no {} in {})".format(fn, var_name, value_range))
+                use_files[i] = False
+
+        return use_files
+
+    def build_stats(self, var_names, sidecar_dir=None):
+        """
+        Method that computes (or loads from sidecars) per time step summary
+        statistics for variables and stores them in self.stats for later use,
+        e.g. for the value_range option in self.get_var().
+
+        Args:
+            var_names (list)  : List of names of variables to index
+            sidecar_dir (str) : Directory for the sidecars, None to put them next
+                                to the data files (falls back to a user cache
+                                directory if not writable)
+        Returns:
+            stats (StatsIndex) : The statistics index (also stored in self.stats)
+        """
+        self.stats = stats.StatsIndex(self, sidecar_dir)
+        self.stats.build(var_names)
+        return self.stats
+
+    def _alloc_data(self, var_name, shape, masked, dtype):
+        """
+        Method that allocates the full output array for a variable once, such
+        that data from (possibly) multiple files can be read directly into it.
+        If the array is larger than self.memory_budget, it is backed by a
+        (never masked) temporary file in self.memmap_dir, or an error is
+        raised if no such directory is set. Like np.empty, the memmap is not
+        initialized (zero-filled by the OS), as every element is written by
+        the read (fill values become NaN then).
+
+        Args:
+            var_name (str)   : Name of variable to allocate for
+            shape (list)     : Shape of the output array
+            masked (bool)    : If True allocate a masked array, else a plain ndarray
+            dtype (np.dtype) : Output dtype, None to use the dtype of the variable
+        Returns:
+            data (ndarray) : Uninitialized array of the output shape (a masked
+                             array starts without a mask, i.e. with nomask)
+        """
+        result_dtype = self._result_dtype(var_name, masked, dtype)
+        nbytes = self._result_nbytes(shape, result_dtype, masked)
+
+        if self.memory_budget is not None and nbytes > self.memory_budget:
+            if self.memmap_dir is None:
+                hints = ["narrow the limits"]
+
+                if masked:
+                    hints.append("use masked=False")
+
+                if result_dtype.itemsize > 4:
+                    hints.append("use dtype=np.float32")
+
+                hints.append("set memmap_dir for a disk-backed result")
+                raise MemoryError("{} with shape {} needs {:.3g} GB, above memory_budget of {:.3g} GB! "
+                                  "Either {}".format(var_name, tuple(shape), nbytes / 1e9,
+                                                     self.memory_budget / 1e9, ", ".join(hints)))
+
+            return self._alloc_memmap(var_name, shape, self._result_dtype(var_name, False, dtype))
+
+        dtype = self._result_dtype(var_name, masked, dtype)
+
+        if masked:
+            return np.ma.masked_array(np.empty(tuple(shape), dtype=dtype), mask=np.ma.nomask)
+
+        return np.empty(tuple(shape), dtype=dtype)
+
+    def _alloc_memmap(self, var_name, shape, dtype):
+        """
+        Method that allocates an output array backed by a temporary file in
+        self.memmap_dir. The file is removed as soon as it is mapped (where the
+        OS allows it), such that the disk space is freed with the array.
+
+        Args:
+            var_name (str)   : Name of variable to allocate for
+            shape (list)     : Shape of the output array
+            dtype (np.dtype) : Output dtype
+        Returns:
+            data (np.memmap) : Disk-backed array of the output shape
+        """
+        fd, path = tempfile.mkstemp(prefix="{}_".format(var_name), suffix=".dat", dir=self.memmap_dir)
+        logging.debug("result above memory_budget, using memmap file {}".format(path))
+
+        with os.fdopen(fd, "wb"):
+            data = np.memmap(path, dtype=dtype, mode="w+", shape=tuple(shape))
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # e.g. not allowed on windows while mapped
+
+        return data
+
+    def _result_dtype(self, var_name, masked, dtype):
+        """
+        Method that gives the dtype of the data array returned by self.get_var().
+
+        Args:
+            var_name (str)   : Name of variable
+            masked (bool)    : False if fill values are to become NaN
+            dtype (np.dtype) : User requested dtype, None for the unpacked dtype
+        Returns:
+            dtype (np.dtype) : Dtype of the result
+        """
+        if dtype is None:
+            return self._unpacked_dtype(self.catalog.get_var(var_name), masked)
+
+        return np.dtype(dtype)
+
+    def _result_nbytes(self, shape, dtype, masked):
         """
-        Method that reads an n-dimensional variable from a dataset.
+        Method that estimates the memory of a result array. For a masked array, the
+        boolean mask is included, as it is created as soon as any value is masked.
+
+        Args:
+            shape (list)     : Shape of the array
+            dtype (np.dtype) : Dtype of the array
+            masked (bool)    : True if the array is masked
+        Returns:
+            nbytes (int) : Number of bytes
+        """
+        size = int(np.prod(shape, dtype=np.int64))
+        return size * (np.dtype(dtype).itemsize + (1 if masked else 0))
+
+    def _unpacked_dtype(self, nc_var, masked):
+        """
+        Method that finds the dtype a variable has after mask/scale is applied.
+        Packed variables take the dtype of their scale_factor/add_offset, and a
+        float type is needed when fill values are to be represented by NaN.
+
+        Args:
+            nc_var (VarSchema) : Variable (schema) to find the unpacked dtype for
+            masked (bool)      : False if fill values are to become NaN
+        Returns:
+            dtype (np.dtype) : Dtype of the unpacked variable
+        """
+        dtype = nc_var.dtype
+
+        if hasattr(nc_var, "scale_factor") or hasattr(nc_var, "add_offset"):
+            dtype = np.result_type(getattr(nc_var, "scale_factor", 1.0),
+                                   getattr(nc_var, "add_offset", 0.0))
+
+        if not masked and not np.issubdtype(dtype, np.floating):
+            dtype = np.float64
+
+        return np.dtype(dtype)
+
+    def _read_var_nd(self, var_name, slices, dataset, out, masked):
+        """
+        Method that reads an n-dimensional variable from a dataset straight
+        into a preallocated output array. The read is split into chunk-aligned
+        blocks by a ReadPlan, which also tunes the chunk cache of the variable.
+        If self.memory_budget is set, half of it bounds the memory of each block
+        and the other half the chunk cache, so that e.g. a result backed by a
+        memmap is really read out-of-core.
 
         Args:
             var_name (str)    : Name of variable to read
             slices (tuple)    : Tuple of slice objects (one for each dimension)
                                 for indexing the variable
             dataset (Dataset) : The dataset to read from
+            out (ndarray)     : Array (view) to store the data in
+            masked (bool)     : If True let netCDF4 do mask/scale as usual
+        """
+        nc_var = dataset.variables[var_name]
+        cache_budget, block_budget = self.chunk_cache_budget, None
+
+        if self.memory_budget is not None:
+            block_budget = self.memory_budget // 2
+            cache_budget = min(cache_budget, self.memory_budget // 2)
+
+        plan = readplan.ReadPlan(nc_var, slices, cache_budget, block_budget, out.dtype.itemsize)
+        plan.apply_cache(nc_var)
+
+        if not masked:
+            nc_var.set_auto_maskandscale(False)
+
+        for src, dst in plan.blocks():
+            logging.debug("reading block {} of {}".format(src, var_name))
+
+            if masked:
+                block = nc_var[src]
+                out[dst] = block if np.ma.is_masked(block) else np.ma.getdata(block)  # mask only if needed
+            else:
+                self._unpack_into(nc_var, nc_var[src], out[dst + (Ellipsis,)])  # view, also 0-d
+
+    def _unpack_into(self, nc_var, raw, out):
+        """
+        Method that stores raw (packed) values in an output array and applies
+        fill values and scaling in place on it, such that no intermediate
+        masked array is created.
+
+        Args:
+            nc_var (netCDF4.Variable) : Variable the raw data were read from
+            raw (ndarray)             : Raw data read with auto mask/scale off
+            out (ndarray)             : Array (view) to store the unpacked data in
         """
-        return dataset.variables[var_name][slices]
+        invalid = self._invalid_values(nc_var, raw)
+        out[...] = raw
+
+        if hasattr(nc_var, "scale_factor"):
+            out *= nc_var.scale_factor
+
+        if hasattr(nc_var, "add_offset"):
+            out += nc_var.add_offset
+
+        if invalid is not None:
+            out[invalid] = np.nan
+
+    def _invalid_values(self, nc_var, raw):
+        """
+        Method that finds the elements of a raw (packed) array that netCDF4 would
+        mask, i.e. values equal to _FillValue/missing_value or outside valid range.
+
+        Args:
+            nc_var (netCDF4.Variable) : Variable the raw data were read from
+            raw (ndarray)             : Raw data read with auto mask/scale off
+        Returns:
+            invalid (ndarray) : Boolean array, or None if no values are invalid
+        """
+        fill_values = list(np.atleast_1d(getattr(nc_var, "missing_value", [])))
+
+        if hasattr(nc_var, "_FillValue"):
+            fill_values.append(nc_var._FillValue)
+        elif nc_var.dtype.str[1:] in netCDF4.default_fillvals and nc_var.dtype.itemsize > 1:
+            fill_values.append(netCDF4.default_fillvals[nc_var.dtype.str[1:]])
+
+        valid_min, valid_max = getattr(nc_var, "valid_range", (None, None))
+        valid_min = getattr(nc_var, "valid_min", valid_min)
+        valid_max = getattr(nc_var, "valid_max", valid_max)
+        invalid = np.zeros(raw.shape, dtype=bool)
+
+        for fill_value in fill_values:
+            invalid |= raw == fill_value
+
+        if valid_min is not None:
+            invalid |= raw < valid_min
+
+        if valid_max is not None:
+            invalid |= raw > valid_max
+
+        if not invalid.any():
+            return None
+
+        return invalid
 
     def _var2var_limits(self, var_name, **limits):
         """
@@ -405,5 +791,5 @@ class NetcdfOut(object):
             limits (dict)  : Dict of limits from e.g. some other variable
                              to extract a subset of for <var_name>
         """
-        with netCDF4.Dataset(self.filepaths[0], mode="r") as ds:
-            return {k: v for k, v in limits.items() if k in ds.variables[var_name].dimensions}
+        dim_names = self._get_var_attr(var_name, "dimensions")
+        return {k: v for k, v in limits.items() if k in dim_names}
@@ -1,4 +1,7 @@
 
+import logging
+import numpy as np
+
 class OutVar(object):
     """Class representing a output variable generated in the NetcdfOut.get_var() method.
     When extracting a variable from a netcdf file, an instance of this class will be
@@ -6,7 +9,15 @@ class OutVar(object):
     to that instance. Although, the class is meant as support to the NetcdfOut class,
     one might find uses outside of that too. Various methods working on the attributes
     are defined below as well.
+
+    The class is kept compact for passing between processes: attributes are slots,
+    time is a datetime64 array and lims/bounds are integer arrays. After calling
+    share(), the data array lives in a multiprocessing.shared_memory block and a
+    pickled instance only carries the name of that block instead of the data.
     """
+    __slots__ = ["name", "meta", "lims", "bounds", "t_dist", "use_files", "dim_names",
+                 "data", "time_name", "time", "t_indices", "shm", "shm_owner"]
+
     def __init__(self):
         """Constructor setting all attributes to None. They are expected
         to be modified externally (e.g. by the NetcdfOut class)."""
@@ -14,12 +25,15 @@ class OutVar(object):
         self.meta = None
         self.lims = None
         self.bounds = None
-        self.time_dist = None
+        self.t_dist = None
         self.use_files = None
         self.dim_names = None
         self.data = None
         self.time_name = None
         self.time = None
+        self.t_indices = None
+        self.shm = None
+        self.shm_owner = False
 
     def get_lim(self, dim_name):
         """
@@ -32,9 +46,9 @@ class OutVar(object):
         """
         for i in range(len(self.dim_names)):
             if self.dim_names[i] == dim_name:
-                return self.lims[i]
+                return tuple(np.asarray(self.lims[i]).tolist())
 
-        raise ValueError("{} is not a dimension of {}!".format(dim_name, self.var_name))
+        raise ValueError("{} is not a dimension of {}!".format(dim_name, self.name))
 
     def get_bound(self, dim_name):
         """
@@ -49,7 +63,7 @@ class OutVar(object):
             if self.dim_names[i] == dim_name:
                 return self.bounds[i]
 
-        raise ValueError("{} is not a dimension of {}!".format(dim_name, self.var_name))
+        raise ValueError("{} is not a dimension of {}!".format(dim_name, self.name))
 
     def identify_dim(self, suggestions):
         """
@@ -82,6 +96,9 @@ class OutVar(object):
             l0 = 0 if l0 is None else l0
             l1 = self.get_bound(dim_name) if l1 is None else l1
 
+            if dim_name == self.time_name and self.t_indices is not None:
+                l0, l1 = 0, len(self.t_indices) - 1  # time steps actually extracted
+
             if l1 - l0 > 0:
                 range_dims.append(dim_name)
 
@@ -107,7 +124,7 @@ class OutVar(object):
             val = getattr(obj, a, None)
 
             if val:
-                return val.encode("utf8").capitalize()
+                return str(val).capitalize()
 
         return "N/A"
 
@@ -124,17 +141,109 @@ class OutVar(object):
 
         for d_name, lim in zip(self.dim_names, self.lims):
             if d_name not in exclude:
-                if lim[0] == lim[1]:
+                if d_name == self.time_name and self._skipped_time(lim):
+                    lims_str += "{}: {} steps in {}".format(d_name, len(self.t_indices),
+                                                            tuple(np.asarray(lim).tolist()))
+
+                elif lim[0] == lim[1]:
                     lims_str += "{}: {}".format(d_name, lim[0])
 
                 else:
-                    lims_str += "{}: {}".format(d_name, lim)
+                    lims_str += "{}: {}".format(d_name, tuple(np.asarray(lim).tolist()))
 
                 if d_name != self.dim_names[-1]:
                     lims_str += ", "
 
         return lims_str + ")"
 
+    def _skipped_time(self, lim):
+        """Method that tells if some time steps within lim were not extracted."""
+        if self.t_indices is None or lim[0] is None or lim[1] is None:
+            return False
+
+        return len(self.t_indices) != lim[1] - lim[0] + 1
+
+    def share(self):
+        """
+        Method that moves the data array into a new shared memory block, such that
+        pickling the instance (e.g. sending it to another process) only transfers a
+        small descriptor. The creating process owns the block and should call
+        release() when all processes are done with it.
+
+        Returns:
+            self (OutVar) : The instance itself, now backed by shared memory
+        """
+        from multiprocessing import shared_memory
+
+        if self.shm is not None:
+            return self
+
+        if np.ma.isMaskedArray(self.data):
+            raise TypeError("Can not share masked data of {}, use masked=False".format(self.name))
+
+        data = np.asarray(self.data)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        self.data = np.ndarray(data.shape, dtype=data.dtype, buffer=self.shm.buf)
+        self.data[...] = data
+        self.shm_owner = True
+        return self
+
+    def release(self, keep=False):
+        """
+        Method that detaches from the shared memory block (and frees it if owner).
+        The data array is a view of the block, so it is dropped unless keep is True.
+
+        Args:
+            keep (bool) : True to keep a private copy of the data (costs a full copy)
+        """
+        if self.shm is None:
+            return
+
+        self.data = np.array(self.data) if keep else None
+        self.shm.close()
+
+        if self.shm_owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                logging.debug("shared memory of {} was already unlinked".format(self.name))
+
+        self.shm = None
+        self.shm_owner = False
+
+    def __getstate__(self):
+        """Method giving the pickled state, with only a descriptor for shared data."""
+        state = {a: getattr(self, a) for a in self.__slots__ if a not in ["shm", "shm_owner"]}
+
+        if self.shm is not None:
+            state["data"] = ("shm", self.shm.name, self.data.shape, self.data.dtype.str)
+
+        return state
+
+    def __setstate__(self, state):
+        """Method restoring a pickled instance, attaching to shared data if any."""
+        self.shm = None
+        self.shm_owner = False
+
+        for attr, val in state.items():
+            setattr(self, attr, val)
+
+        if type(self.data) is tuple and self.data[0] == "shm":
+            from multiprocessing import shared_memory
+            _, shm_name, shape, dtype = self.data
+
+            try:
+                self.shm = shared_memory.SharedMemory(name=shm_name, track=False)
+            except TypeError:  # python < 3.13 registers the block, which would unlink it at exit
+                import multiprocessing
+                from multiprocessing import resource_tracker
+                self.shm = shared_memory.SharedMemory(name=shm_name)
+
+                if multiprocessing.parent_process() is None:  # children share the tracker of the owner
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+
+            self.data = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
     def __getitem__(self, indices):
         """
         Method to support instance indexing/slicing.
@@ -0,0 +1,212 @@
+import logging
+import itertools
+import numpy as np
+
+class ReadPlan(object):
+    """Class representing a chunk-aware plan for reading a hyperslab of a netcdf variable.
+    For chunked and compressed variables, HDF5 decompresses entire chunks into its chunk
+    cache, so a thin window read with a too small cache may decompress the same chunk many
+    times. The plan splits the requested slab at chunk boundaries along the leading
+    dimensions (coalescing neighbouring chunks as long as they fit the cache budget), orders
+    the reads in storage order so that each chunk is touched by exactly one read, and sizes
+    the chunk cache of the variable to hold the chunks of one read.
+
+    If a block budget is given (whatever the chunking and compression), the reads are
+    further split along the leading dimensions so that the memory one read needs (raw
+    values, mask and unpacked values) stays within the budget, e.g. for out-of-core reads.
+    """
+    compression_filters = ["zlib", "szip", "zstd", "bzip2", "blosc"]
+
+    def __init__(self, nc_var, slices, cache_budget, block_budget=None, out_itemsize=8):
+        """
+        Constructor that inspects the chunking and filters of the variable
+        and computes the blocks to read.
+
+        Args:
+            nc_var (netCDF4.Variable) : Variable to plan the read for
+            slices (tuple)            : Tuple of slice objects (one for each dimension)
+            cache_budget (int)        : Max number of bytes to use for the chunk cache
+            block_budget (int)        : Max number of bytes of memory for one read,
+                                        None for no limit
+            out_itemsize (int)        : Bytes per element of the unpacked values
+        """
+        self.name = nc_var.name
+        self.shape = nc_var.shape
+        self.itemsize = nc_var.dtype.itemsize
+        self.chunks = nc_var.chunking()
+        self.filters = nc_var.filters() or dict()
+        self.cache_budget = cache_budget
+        self.block_budget = block_budget
+        self.block_itemsize = 2 * self.itemsize + out_itemsize + 2  # raw (+ copy), masks, unpacked
+        self.sel = [s.indices(n)[:2] for s, n in zip(slices, self.shape)]
+        self.split_dim, self.group = self._compute_split()
+
+    def is_chunked(self):
+        """Method that tells if the variable is stored in chunks."""
+        return self.chunks not in [None, "contiguous"] and len(self.shape) > 0
+
+    def is_compressed(self):
+        """Method that tells if any compression filter is applied to the variable."""
+        return any(self.filters.get(f) for f in self.compression_filters)
+
+    def chunk_segments(self, dim):
+        """
+        Method that splits the selection along a dimension at chunk boundaries.
+
+        Args:
+            dim (int) : Index of the dimension
+        Returns:
+            segments (list) : List of (start, stop) tuples, each within one chunk
+        """
+        start, stop = self.sel[dim]
+        size = self.chunks[dim]
+        edges = list(range((start // size + 1) * size, stop, size))
+        return list(zip([start] + edges, edges + [stop]))
+
+    def chunk_nbytes(self):
+        """Method that gives the (uncompressed) size of one chunk in bytes."""
+        return int(np.prod(self.chunks)) * self.itemsize
+
+    def _compute_split(self):
+        """
+        Method that finds the number of leading dimensions that must be read
+        chunk by chunk for the chunks touched by one read to fit in the cache
+        budget, and how many chunk segments along the innermost split dimension
+        can be coalesced into a single read.
+
+        Returns:
+            split_dim (int) : Number of leading dims to split at chunk boundaries
+            group (int)     : Number of chunk segments coalesced along the last split dim
+        """
+        if not (self.is_chunked() and self.is_compressed()):
+            return 0, 1  # uncompressed chunks are read partially by HDF5 anyway
+
+        n_chunks = [len(self.chunk_segments(d)) for d in range(len(self.shape))]
+
+        for split_dim in range(len(self.shape) + 1):
+            nbytes = int(np.prod(n_chunks[split_dim:])) * self.chunk_nbytes()
+
+            if nbytes <= self.cache_budget:
+                break
+
+        if split_dim == 0:
+            return 0, 1
+
+        group = max(1, self.cache_budget // nbytes)
+        group = min(group, n_chunks[split_dim - 1])
+        return split_dim, group
+
+    def cache_params(self):
+        """
+        Method that gives chunk cache parameters large enough to hold all the
+        chunks touched by one read of the plan.
+
+        Returns:
+            size (int)   : Size of the chunk cache in bytes
+            nelems (int) : Number of hash slots in the chunk cache
+        """
+        n_chunks = [len(self.chunk_segments(d)) for d in range(len(self.shape))]
+        n_chunks[:self.split_dim] = [1 for _ in range(self.split_dim)]
+
+        if self.split_dim > 0:
+            n_chunks[self.split_dim - 1] = self.group
+
+        n_per_read = int(np.prod(n_chunks))
+        return n_per_read * self.chunk_nbytes(), _next_prime(max(1009, 10 * n_per_read))
+
+    def apply_cache(self, nc_var):
+        """
+        Method that tunes the chunk cache of the variable to the access pattern.
+
+        Args:
+            nc_var (netCDF4.Variable) : Variable to set the chunk cache for
+        """
+        if not (self.is_chunked() and self.is_compressed()):
+            return
+
+        size, nelems = self.cache_params()
+        size = max(size, nc_var.get_var_chunk_cache()[0])
+        nc_var.set_var_chunk_cache(size=size, nelems=nelems)
+        logging.debug("chunk cache for {} set to {} bytes, {} slots".format(self.name, size, nelems))
+
+    def blocks(self):
+        """
+        Generator that yields the reads of the plan in storage order, each
+        within the block budget (if any).
+
+        Yields:
+            src (tuple) : Tuple of slices to index the netcdf variable with
+            dst (tuple) : Tuple of slices into the output array of the full selection
+        """
+        for src, dst in self._chunk_blocks():
+            for block in self._split_block(src, dst):
+                yield block
+
+    def _split_block(self, src, dst):
+        """
+        Generator that splits a read along its leading dimensions such that
+        each part needs at most self.block_budget bytes of memory.
+
+        Args:
+            src (tuple) : Tuple of slices to index the netcdf variable with
+            dst (tuple) : Tuple of slices into the output array
+        Yields:
+            src (tuple) : Tuple of slices of a part to index the netcdf variable with
+            dst (tuple) : Tuple of slices of the part into the output array
+        """
+        lengths = [s.stop - s.start for s in src]
+
+        if self.block_budget is None or int(np.prod(lengths)) * self.block_itemsize <= self.block_budget:
+            yield src, dst
+            return
+
+        # first dim where a single index of it (with all trailing dims) fits the budget
+        for dim in range(len(lengths)):
+            nbytes = int(np.prod(lengths[dim + 1:])) * self.block_itemsize
+
+            if nbytes <= self.block_budget:
+                break
+
+        step = max(1, self.block_budget // nbytes)
+        leading = [range(s.start, s.stop) for s in src[:dim]]
+
+        for idx in itertools.product(*leading):
+            for start in range(src[dim].start, src[dim].stop, step):
+                part = tuple(slice(i, i + 1) for i in idx) + (slice(start, min(start + step, src[dim].stop)),)
+                part = part + tuple(src[dim + 1:])
+                part_dst = tuple(slice(p.start - s.start + d.start, p.stop - s.start + d.start)
+                                 for p, s, d in zip(part, src, dst))
+                yield part, part_dst
+
+    def _chunk_blocks(self):
+        """
+        Generator that yields the chunk-aligned reads of the plan in storage order.
+
+        Yields:
+            src (tuple) : Tuple of slices to index the netcdf variable with
+            dst (tuple) : Tuple of slices into the output array of the full selection
+        """
+        split_segments = list()
+
+        for dim in range(self.split_dim):
+            segments = self.chunk_segments(dim)
+
+            if dim == self.split_dim - 1:  # coalesce neighbouring chunks into one read
+                segments = [(segments[i][0], segments[min(i + self.group, len(segments)) - 1][1])
+                            for i in range(0, len(segments), self.group)]
+
+            split_segments.append(segments)
+
+        tail = [slice(start, stop) for start, stop in self.sel[self.split_dim:]]
+
+        for segments in itertools.product(*split_segments):
+            src = tuple(slice(start, stop) for start, stop in segments) + tuple(tail)
+            dst = tuple(slice(s.start - start, s.stop - start) for s, (start, _) in zip(src, self.sel))
+            yield src, dst
+
+def _next_prime(n):
+    """Function that gives the smallest prime number >= n (used for hash slots)."""
+    while any(n % d == 0 for d in range(2, int(n ** 0.5) + 1)):
+        n += 1
+
+    return n
@@ -23,8 +23,13 @@ import cmocean  # for colormaps
 
 # module(s) part of this package
 from . import ncout
+from . import outvar
+from . import grid
+from . import zslice
 
 class RomsViz(ncout.NetcdfOut):
+    varinfo_cache = dict()
+
     def __init__(self, filename, varinfo_file="romsviz/varinfo.json"):
         super(RomsViz, self).__init__(filename)
         self.varinfo_file = varinfo_file
@@ -33,15 +38,36 @@ class RomsViz(ncout.NetcdfOut):
         plt.style.use("seaborn-deep")
         plt.rc("font", family="serif")
         self.var_info = self.load_varinfo(varinfo_file)
+        self.zslicers = dict()
+        self.grid = None
 
     def set_gridfile(self, filename):
-        """Method docstring..."""
+        """Method that sets the grid file and loads its horizontal grid into memory."""
         self.gridfile = ncout.NetcdfOut(filename)
+        self.grid = grid.RomsGrid(self.gridfile)
+
+    def get_grid(self):
+        """Method that gives the cached grid, loaded from the data files if no grid file is set."""
+        if self.grid is None:
+            self.grid = grid.RomsGrid(self)
+
+        return self.grid
+
+    def get_axis(self, axis_name, **limits):
+        """Method that gives a coordinate variable, sliced from the cached grid if it is there."""
+        if axis_name in self.get_grid().fields:
+            return self.grid.get_var(axis_name, **{k: v for k, v in limits.items()
+                                                   if k in self.grid.dims[axis_name]})
+
+        return self.get_var(axis_name, **self._var2var_limits(axis_name, **limits))
 
     def load_varinfo(self, infofile):
-        """Method docstring..."""
-        with open(infofile, "r") as nl:
-            return json.load(nl)
+        """Method that loads the variable info file (once per file, shared by instances)."""
+        if infofile not in self.varinfo_cache:
+            with open(infofile, "r") as nl:
+                self.varinfo_cache[infofile] = json.load(nl)
+
+        return self.varinfo_cache[infofile]
 
     def time_series(self, var_name, figax=None, **limits):
         """Method docstring..."""
@@ -102,30 +128,28 @@ class RomsViz(ncout.NetcdfOut):
 
     def csection(self, var_name, figax=None, lonlat=False, **limits):
         """Method docstring..."""
-        var = self.get_var(var_name, **limits)
+        var = self.get_var(var_name, masked=False, dtype=np.float32, **limits)
         range_dims = var.get_range_dims(enforce=2)
         xaxis_name = self.vardim_to_axisdim(var.name, "xaxis", range_dims)
         yaxis_name = self.vardim_to_axisdim(var.name, "yaxis", range_dims)
-        x_axis = self.get_var(xaxis_name, **self._var2var_limits(xaxis_name, **limits))
-        y_axis = self.get_var(yaxis_name, **self._var2var_limits(yaxis_name, **limits))
-
-        print(var.data.mask)
+        x_axis = self.get_axis(xaxis_name, **limits)
+        y_axis = self.get_axis(yaxis_name, **limits)
+        self.get_grid().apply_mask(var)  # land to NaN in place
 
         # plot time series with dates on the x-axis
         fig, ax = self._get_figax(figsize=(12,5), figax=figax)
-        cs = ax.contourf(x_axis.data, y_axis.data, np.ma.masked_where(var.data==var.data.max(), var.data), 50, cmap=cmocean.cm.thermal)
+        cs = ax.contourf(x_axis.data, y_axis.data, var.data, self.get_levels(var, 50), cmap=cmocean.cm.thermal)
 
         # colorbar stuff
         divider = mpl_toolkits.axes_grid1.make_axes_locatable(ax)
         cax = divider.append_axes("right", size="2.5%", pad=0.15)
-        #cbar_label = var.attr_to_string(var.meta, "units")
-        cbar_label = "hax"
+        cbar_label = var.attr_to_string(var.meta, "units")
         cb = plt.colorbar(cs, cax=cax, label=cbar_label, orientation="vertical")
 
         # title and labels
-        #name = var.attr_to_string(var.meta, ["long_name", "standard_name"])
+        name = var.attr_to_string(var.meta, ["long_name", "standard_name"])
         limits_str = var.lims_to_str(exclude=[var.time_name, "s_rho"])
-        ax.set_title("{} {}".format("hax", limits_str))
+        ax.set_title("{} {}".format(name, limits_str))
         ax.set_ylabel("Depth [m]")
         ax = self._set_default_txtprop(ax)
 
@@ -134,10 +158,139 @@ class RomsViz(ncout.NetcdfOut):
 
         return fig, ax
 
-    def horizontal_csection(self, var_name, figax=None, **limits):
-        """Method docstring..."""
-        limits["s_rho"] = 41  # default to surface
-        raise NotImplementedError
+    def horizontal_csection(self, var_name, depth, figax=None, **limits):
+        """Method that plots a variable interpolated to a constant depth [m] at one time."""
+        var = self.get_zslice(var_name, depth, **limits)
+
+        if var.data.ndim != 2:
+            raise ValueError("Need exactly one time step, got shape {}".format(var.data.shape))
+
+        stagger = self.get_grid().get_stagger(var.dim_names)
+        lon_lim = dict(zip(var.dim_names[-2:], [tuple(l) for l in var.lims[-2:]]))
+        lon = self.grid.get_var("lon_{}".format(stagger), **lon_lim)
+        lat = self.grid.get_var("lat_{}".format(stagger), **lon_lim)
+
+        fig, ax = self._get_figax(figsize=(12,7), figax=figax)
+        cs = ax.contourf(lon.data, lat.data, var.data, self.get_levels(var, 50), cmap=cmocean.cm.thermal)
+
+        # colorbar stuff
+        divider = mpl_toolkits.axes_grid1.make_axes_locatable(ax)
+        cax = divider.append_axes("right", size="2.5%", pad=0.15)
+        cbar_label = var.attr_to_string(var.meta, "units")
+        cb = plt.colorbar(cs, cax=cax, label=cbar_label, orientation="vertical")
+
+        # title and labels
+        name = var.attr_to_string(var.meta, ["long_name", "standard_name"])
+        time_str = "" if var.time is None else var.time[0]
+        ax.set_title("{} at {} m {}".format(name, depth, time_str))
+        ax = self._set_default_txtprop(ax)
+        fig.tight_layout()
+
+        return fig, ax
+
+    def get_zslice(self, var_name, depth, **limits):
+        """
+        Method that interpolates a variable on s-levels to a constant depth for all
+        time steps within the limits. Interpolation weights are cached (see ZSlicer).
+        For each time step, only the level pairs bracketing the depth are read, each
+        within the bounding box of the points that use it, or a single slab of all
+        levels spanned in the window if that is smaller (see ZSlicer.level_boxes).
+
+        Args:
+            var_name (str)      : Name of variable on s_rho or s_w levels
+            depth (float)       : Depth [m] (positive downwards) to interpolate to
+            limits (str: tuple) : Index limits for the time and horizontal dimensions
+        Returns:
+            var (OutVar) : Variable with dimensions (time, eta, xi) (squeezed)
+        """
+        dim_names = list(self._get_var_attr(var_name, "dimensions"))
+        self._verify_kwargs(var_name, dim_names, **limits)
+        z_names = [d for d in dim_names if d in ["s_rho", "s_w"]]
+
+        if not z_names or z_names[0] in limits:
+            raise ValueError("{} needs an s-dimension without limits for z-slices".format(var_name))
+
+        z_name = z_names[0]
+        y_name, x_name = dim_names[-2:]
+        stagger = x_name.split("_")[-1]
+        slicer = self.get_zslicer(z_name, stagger)
+        h_lims = self._get_dim_lims([y_name, x_name], **limits)
+        h_slices = self._lims_to_slices(h_lims)
+        y_0, x_0 = [0 if l[0] is None else l[0] for l in h_lims]  # window offset
+
+        var = outvar.OutVar()
+        var.name = var_name
+        var.time_name = self.time_name
+        var.dim_names = [d for d in dim_names if d != z_name]
+        var.meta = self.catalog.get_var(var_name)
+        var.bounds = [b for d, b in zip(dim_names, var.meta.shape) if d != z_name]
+        var.lims = self._get_dim_lims(var.dim_names, **limits)
+        h_shape = self._lims_to_shape(h_lims, var.bounds[-2:])
+
+        if self.time_name in dim_names:
+            self.set_time_array()
+            var.bounds[0] = self._get_num_time_entries()
+            var.lims[0] = self._get_time_lims(var.lims[0], var.bounds[0])
+            self._verify_lims(var.lims, var.bounds, var.dim_names)
+            var.t_indices = np.arange(var.lims[0][0], var.lims[0][1] + 1)
+            var.time = self.time[var.t_indices]
+            zeta = self.get_var("zeta", masked=False, **{self.time_name: var.lims[0]}).data
+            zeta = zeta.reshape((-1,) + zeta.shape[-2:])  # keep time axis if only one step
+            steps = range(var.lims[0][0], var.lims[0][1] + 1)
+        else:
+            zeta, steps = [None], [None]
+
+        data = np.full([len(steps)] + h_shape, np.nan)
+
+        for i, t in enumerate(steps):
+            zeta_t = None if zeta[i] is None else zslice.to_stagger(zeta[i], stagger)
+            k, w, valid = [a[h_slices] for a in slicer.weights(depth, zeta_t)]
+
+            if not valid.any():
+                continue  # depth below the bottom everywhere
+
+            for k_lim, y_lim, x_lim in slicer.level_boxes(k, valid):
+                read_lims = {z_name: k_lim, y_name: (y_0 + y_lim[0], y_0 + y_lim[1]),
+                             x_name: (x_0 + x_lim[0], x_0 + x_lim[1])}
+
+                if t is not None:
+                    read_lims[self.time_name] = t
+
+                box = (slice(y_lim[0], y_lim[1] + 1), slice(x_lim[0], x_lim[1] + 1))
+                field = self.get_var(var_name, masked=False, **read_lims).data
+                field = field.reshape([k_lim[1] - k_lim[0] + 1] + list(k[box].shape))
+                use = valid[box] & (k[box] >= k_lim[0]) & (k[box] < k_lim[1])
+                np.copyto(data[i][box], slicer.interpolate(field, k[box] - k_lim[0], w[box], use), where=use)
+
+        var.data = data.squeeze()
+        var.lims = self._fill_lims(var.lims, var.bounds)
+        var.bounds = np.array(var.bounds, dtype=np.int64)
+        return var
+
+    def get_zslicer(self, z_name, stagger):
+        """Method that gives the (cached) ZSlicer for a vertical and horizontal staggering."""
+        if (z_name, stagger) not in self.zslicers:
+            h = self.get_grid().get_var("h" if stagger == "rho" else "h_{}".format(stagger)).data
+            H_c = float(self.get_var("hc").data)
+            vtrans = int(self.get_var("Vtransform").data)
+            C_name = "Cs_r" if z_name == "s_rho" else "Cs_w"
+            s = self.get_var(z_name, masked=False).data
+            C = self.get_var(C_name, masked=False).data
+            self.zslicers[(z_name, stagger)] = zslice.ZSlicer(h, H_c, s, C, vtrans)
+
+        return self.zslicers[(z_name, stagger)]
+
+    def get_levels(self, var, num_levels):
+        """Method that gives contour levels, from self.stats (no pass over the data) if available."""
+        if self.stats is None or not self.stats.has_var(var.name):
+            return num_levels  # let matplotlib find levels from the data
+
+        levels = self.stats.levels(var.name, num_levels, t_indices=var.t_indices)
+
+        if not levels[-1] > levels[0]:  # NaN (no valid values in the steps) or constant
+            return num_levels
+
+        return levels
 
     def vardim_to_axisdim(self, var_name, axis_name, range_dims):
         """Method docstring..."""
@@ -148,10 +301,9 @@ class RomsViz(ncout.NetcdfOut):
         raise ValueError("No dim in {} found in {}".format(range_dims, self.var_info[var_name]["csection"][axis_name]))
 
     def lonlat_from_lims(self, x_lim, y_lim):
-        """Method docstring..."""
-        raise NotImplementedError
-        lon_var = self.get_var("lon_rho", xi_rho=x_lim, eta_rho=y_lim)
-        lat_var = self.get_var("lat_rho", xi_rho=x_lim, eta_rho=y_lim)
+        """Method that gives lon/lat at rho-points within index limits (from the cached grid)."""
+        lon_var = self.get_grid().get_var("lon_rho", xi_rho=x_lim, eta_rho=y_lim)
+        lat_var = self.grid.get_var("lat_rho", xi_rho=x_lim, eta_rho=y_lim)
         return lon_var, lat_var
 
     def get_map(self, **map_kwargs):
@@ -167,8 +319,8 @@ class RomsViz(ncout.NetcdfOut):
 
     def get_sdepths(self, var):
         """Method docstring..."""
-        # get necessary variables for the vertical grid
-        h = self.get_var("h").data
+        # get necessary variables for the vertical grid (h from the cached grid)
+        h = self.get_grid().get_var("h").data
         H_c = float(self.get_var("hc").data)
         vtrans = float(self.get_var("Vtransform").data)
 
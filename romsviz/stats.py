@@ -0,0 +1,298 @@
+import os
+import json
+import logging
+import numpy as np
+import netCDF4
+
+class StatsIndex(object):
+    """Class holding per-file, per-variable and per-time-step summary statistics
+    (min, max, mean and count of valid values) for the files of a NetcdfOut instance.
+    The statistics are computed once and stored in a small json sidecar next to each
+    data file (or in a separate directory), so that questions about the range of a
+    variable (colorbar levels, which time steps exceed some value, which files can be
+    skipped) are answered without reading the data again. A sidecar is recomputed if
+    the size or modification time of its data file has changed. If the sidecar can
+    not be written there (e.g. read-only archives), it goes to a user cache directory
+    ($XDG_CACHE_HOME/romsviz or ~/.cache/romsviz) instead, and if that fails too the
+    statistics are only kept in memory.
+    """
+    stat_names = ["min", "max", "mean", "count"]
+
+    def __init__(self, ncout, sidecar_dir=None):
+        """
+        Constructor that sets attributes. Call build() to compute/load statistics.
+
+        Args:
+            ncout (NetcdfOut) : Instance whose files to index
+            sidecar_dir (str) : Directory to store sidecars in, defaults to the
+                                directory of each data file (see class docstring
+                                for the fallback if it is not writable)
+        """
+        self.ncout = ncout
+        self.sidecar_dir = sidecar_dir
+        self.file_stats = [dict() for _ in ncout.filepaths]
+
+    def sidecar_path(self, filename):
+        """
+        Method that gives the preferred path of the sidecar belonging to a data file.
+
+        Args:
+            filename (str) : Path to netcdf data file
+        Returns:
+            path (str) : Path to the json sidecar
+        """
+        directory = self.sidecar_dir or os.path.dirname(filename)
+        return os.path.join(directory, os.path.basename(filename) + ".stats.json")
+
+    def cache_path(self, filename):
+        """
+        Method that gives the fallback path of the sidecar in the user cache
+        directory, mirroring the absolute path of the data file.
+
+        Args:
+            filename (str) : Path to netcdf data file
+        Returns:
+            path (str) : Path to the json sidecar in the cache directory
+        """
+        cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        rel_path = os.path.abspath(filename).lstrip(os.sep)
+        return os.path.join(cache_dir, "romsviz", rel_path + ".stats.json")
+
+    def build(self, var_names):
+        """
+        Method that loads statistics from the sidecars and computes (and stores)
+        the statistics of any variables not already in the sidecars.
+
+        Args:
+            var_names (list) : List of names of variables to index
+        """
+        for i, fn in enumerate(self.ncout.filepaths):
+            sidecar = self._load_sidecar(fn)
+            missing = [v for v in var_names if v not in sidecar["variables"]]
+
+            for var_name in missing:
+                logging.debug("computing stats for {} in {}".format(var_name, fn))
+                sidecar["variables"][var_name] = self._compute_stats(fn, var_name)
+
+            if missing:
+                self._write_sidecar(fn, sidecar)
+
+            self.file_stats[i] = {v: {s: np.array(a, dtype=float) for s, a in stats.items()}
+                                  for v, stats in sidecar["variables"].items()}
+
+    def _write_sidecar(self, filename, sidecar):
+        """
+        Method that writes the sidecar of a data file (through a temporary file
+        that is renamed into place), falling back to the user cache directory,
+        and to not persisting at all, on write failure.
+
+        Args:
+            filename (str) : Path to netcdf data file
+            sidecar (dict) : Sidecar content
+        """
+        for path in [self.sidecar_path(filename), self.cache_path(filename)]:
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+
+            try:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+
+                with open(tmp_path, "w") as f:
+                    json.dump(sidecar, f)
+
+                os.replace(tmp_path, path)  # atomic, readers never see a partial sidecar
+                return
+
+            except (IOError, OSError) as e:
+                logging.debug("could not write sidecar {} ({})".format(path, e))
+
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        logging.warning("stats for {} are not persisted (no writable sidecar location)".format(filename))
+
+    def _load_sidecar(self, filename):
+        """
+        Method that reads the sidecar of a data file (from the preferred path or
+        the cache directory), or gives an empty one if it does not exist, is
+        outdated or can not be read (it is then recomputed and rewritten).
+
+        Args:
+            filename (str) : Path to netcdf data file
+        Returns:
+            sidecar (dict) : Sidecar content
+        """
+        file_info = os.stat(filename)
+        sidecar = dict(size=file_info.st_size, mtime=file_info.st_mtime, variables=dict())
+        for path in [self.sidecar_path(filename), self.cache_path(filename)]:
+            if not os.path.exists(path):
+                continue
+
+            try:
+                with open(path, "r") as f:
+                    stored = json.load(f)
+
+                if stored["size"] == sidecar["size"] and stored["mtime"] == sidecar["mtime"]:
+                    return stored
+
+            except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+                logging.debug("ignoring unreadable sidecar {} ({})".format(path, e))
+
+        return sidecar
+
+    def _compute_stats(self, filename, var_name):
+        """
+        Method that computes statistics of a variable for each time step in a file
+        (a single "step" if the variable has no time dimension). Only one time step
+        is held in memory at a time.
+
+        Args:
+            filename (str) : Path to netcdf data file
+            var_name (str) : Name of variable to compute statistics for
+        Returns:
+            stats (dict) : Lists of values for each stat in self.stat_names
+        """
+        stats = {s: list() for s in self.stat_names}
+
+        with netCDF4.Dataset(filename, mode="r") as ds:
+            if var_name not in ds.variables.keys():
+                raise ValueError("Invalid variable {}!".format(var_name))
+
+            nc_var = ds.variables[var_name]
+            slices = [slice(None) for _ in nc_var.dimensions]
+
+            if self.ncout.time_name in nc_var.dimensions:
+                t_idx = nc_var.dimensions.index(self.ncout.time_name)
+                num_steps = nc_var.shape[t_idx]
+            else:
+                t_idx, num_steps = None, 1
+
+            shape = [1 if d == t_idx else n for d, n in enumerate(nc_var.shape)]
+            data = np.empty(shape, dtype=np.float64)  # reused for every time step
+
+            for t in range(num_steps):
+                if t_idx is not None:
+                    slices[t_idx] = slice(t, t + 1)
+
+                self.ncout._read_var_nd(var_name, tuple(slices), ds, data, masked=False)
+                count = int(np.count_nonzero(~np.isnan(data)))
+                stats["count"].append(count)
+
+                if count > 0:
+                    stats["min"].append(float(np.nanmin(data)))
+                    stats["max"].append(float(np.nanmax(data)))
+                    stats["mean"].append(float(np.nansum(data)) / count)
+                else:
+                    stats["min"].append(None)
+                    stats["max"].append(None)
+                    stats["mean"].append(None)
+
+        return stats
+
+    def has_var(self, var_name):
+        """Method that tells if statistics for a variable exist in all files."""
+        return all(var_name in fs for fs in self.file_stats)
+
+    def get_stat(self, var_name, stat):
+        """
+        Method that gives a statistic for all time steps across files, i.e. aligned
+        with NetcdfOut.time (one value per file if the variable has no time dimension).
+
+        Args:
+            var_name (str) : Name of variable
+            stat (str)     : One of self.stat_names
+        Returns:
+            values (ndarray) : 1D array of the statistic (NaN if no valid values)
+        """
+        if not self.has_var(var_name):
+            raise ValueError("No stats for {}, use build() first!".format(var_name))
+
+        return np.concatenate([fs[var_name][stat] for fs in self.file_stats])
+
+    def get_range(self, var_name, t_lim=(None, None), file_idx=None, t_indices=None):
+        """
+        Method that gives the min and max of a variable over a range of time steps.
+
+        Args:
+            var_name (str)      : Name of variable
+            t_lim (tuple)       : Start- and end index (inclusive) of time steps, global
+                                  or within file <file_idx> if that is given
+            file_idx (int)      : Index of the file to consider, None for all files
+            t_indices (ndarray) : Indices of time steps to consider, overrides t_lim
+        Returns:
+            vmin (float) : Minimum value (NaN if no valid values)
+            vmax (float) : Maximum value (NaN if no valid values)
+        """
+        if file_idx is None:
+            vmins, vmaxs = self.get_stat(var_name, "min"), self.get_stat(var_name, "max")
+        else:
+            vmins = self.file_stats[file_idx][var_name]["min"]
+            vmaxs = self.file_stats[file_idx][var_name]["max"]
+
+        if t_indices is None:
+            t_indices = slice(t_lim[0], None if t_lim[1] is None else t_lim[1] + 1)
+
+        vmins, vmaxs = vmins[t_indices], vmaxs[t_indices]
+
+        if np.all(np.isnan(vmins)):
+            return np.nan, np.nan
+
+        return np.nanmin(vmins), np.nanmax(vmaxs)
+
+    def can_match(self, var_name, file_idx, t_lim, value_range):
+        """
+        Method that tells if any value of a variable within time steps of a file
+        may be inside a value range. False means the file can safely be skipped.
+
+        Args:
+            var_name (str)      : Name of variable
+            file_idx (int)      : Index of the file
+            t_lim (tuple)       : Start- and end index (inclusive) within the file
+            value_range (tuple) : (vmin, vmax) where None means unbounded
+        Returns:
+            match (bool) : False if no value can be inside value_range
+        """
+        vmin, vmax = self.get_range(var_name, t_lim, file_idx)
+
+        if np.isnan(vmin):
+            return False
+
+        too_low = value_range[1] is not None and vmin > value_range[1]
+        too_high = value_range[0] is not None and vmax < value_range[0]
+        return not (too_low or too_high)
+
+    def steps_in_range(self, var_name, value_range):
+        """
+        Method that tells for each time step whether any value of a variable is
+        inside a value range, e.g. value_range=(15, None) for "exceeds 15".
+
+        Args:
+            var_name (str)      : Name of variable
+            value_range (tuple) : (vmin, vmax) where None means unbounded
+        Returns:
+            in_range (ndarray) : Boolean array aligned with NetcdfOut.time
+        """
+        in_range = self.get_stat(var_name, "count") > 0
+
+        if value_range[0] is not None:
+            in_range &= self.get_stat(var_name, "max") >= value_range[0]
+
+        if value_range[1] is not None:
+            in_range &= self.get_stat(var_name, "min") <= value_range[1]
+
+        return in_range
+
+    def levels(self, var_name, num_levels, t_lim=(None, None), t_indices=None):
+        """
+        Method that gives evenly spaced contour/colorbar levels for a variable.
+
+        Args:
+            var_name (str)      : Name of variable
+            num_levels (int)    : Number of levels
+            t_lim (tuple)       : Start- and end index (inclusive) of time steps
+            t_indices (ndarray) : Indices of time steps to consider, overrides t_lim
+        Returns:
+            levels (ndarray) : Array of levels between min and max
+        """
+        vmin, vmax = self.get_range(var_name, t_lim, t_indices=t_indices)
+        return np.linspace(vmin, vmax, num_levels)
@@ -0,0 +1,157 @@
+import logging
+import numpy as np
+
+class ZSlicer(object):
+    """Class for vectorized interpolation of ROMS sigma-level fields to constant depths.
+    The indices of the levels bracketing a depth and the linear interpolation weights
+    are computed from the sigma-to-z geometry for the whole horizontal grid at once and
+    cached per depth. Since the geometry depends on the free surface (zeta), cached
+    weights are only recomputed when zeta has changed more than zeta_tol somewhere,
+    meaning a time series of constant-depth maps mostly reuses the same weights.
+    """
+    def __init__(self, h, hc, s, C, vtransform, zeta_tol=0.05):
+        """
+        Constructor that stores the vertical grid.
+
+        Args:
+            h (ndarray)        : Bottom depth (2D) at the points of the variable
+            hc (float)         : Critical depth
+            s (ndarray)        : S-coordinates of the levels (s_rho or s_w)
+            C (ndarray)        : Stretching curves of the levels (Cs_r or Cs_w)
+            vtransform (int)   : Vertical transformation equation (1 or 2)
+            zeta_tol (float)   : Change in zeta [m] that triggers new weights
+        """
+        if vtransform not in [1, 2]:
+            raise ValueError("Invalid Vtransform {} (use 1 or 2)!".format(vtransform))
+
+        self.h = np.asarray(h, dtype=np.float64)
+        self.hc = float(hc)
+        self.s = np.asarray(s, dtype=np.float64)[:, None, None]
+        self.C = np.asarray(C, dtype=np.float64)[:, None, None]
+        self.vtransform = vtransform
+        self.zeta_tol = zeta_tol
+        self.cache = dict()
+
+    def z_levels(self, zeta=None):
+        """
+        Method that computes the depth of all levels (negative downwards).
+
+        Args:
+            zeta (ndarray) : Free surface (2D), None for zero
+        Returns:
+            z (ndarray) : 3D array of level depths
+        """
+        zeta = 0.0 if zeta is None else np.where(np.isnan(zeta), 0.0, zeta)
+
+        if self.vtransform == 1:
+            z_0 = self.hc * self.s + (self.h - self.hc) * self.C
+            return z_0 + zeta * (1.0 + z_0 / self.h)
+
+        z_0 = (self.hc * self.s + self.h * self.C) / (self.hc + self.h)
+        return zeta + (zeta + self.h) * z_0
+
+    def weights(self, depth, zeta=None):
+        """
+        Method that gives (cached) indices and weights for interpolation to a depth.
+
+        Args:
+            depth (float)  : Depth [m] (positive downwards) to interpolate to
+            zeta (ndarray) : Free surface (2D), None for zero
+        Returns:
+            k (ndarray)     : Index of the level just below depth (2D)
+            w (ndarray)     : Weight of level k + 1 (2D)
+            valid (ndarray) : False where depth is outside the water column (2D)
+        """
+        cached = self.cache.get(depth)
+
+        if cached is not None and self._same_zeta(cached[0], zeta):
+            return cached[1:]
+
+        logging.debug("computing interpolation weights for depth {}".format(depth))
+        z = self.z_levels(zeta)
+        z_target = -float(depth)
+        k = np.count_nonzero(z <= z_target, axis=0) - 1
+        valid = (k >= 0) & (k < z.shape[0] - 1)
+        k = np.clip(k, 0, z.shape[0] - 2)
+
+        z_below = np.take_along_axis(z, k[None], axis=0)[0]
+        z_above = np.take_along_axis(z, k[None] + 1, axis=0)[0]
+        w = (z_target - z_below) / (z_above - z_below)
+
+        self.cache[depth] = (None if zeta is None else zeta.copy(), k, w, valid)
+        return k, w, valid
+
+    def _same_zeta(self, zeta_ref, zeta):
+        """Method that tells if zeta differs less than self.zeta_tol from zeta_ref."""
+        if zeta_ref is None or zeta is None:
+            return zeta_ref is None and zeta is None
+
+        diff = np.abs(zeta - zeta_ref)
+        return not np.any(diff > self.zeta_tol)  # NaN (land) compares False
+
+    def level_boxes(self, k, valid):
+        """
+        Method that plans what to read for interpolation with the indices k. For each
+        distinct k, only the levels k and k + 1 within the bounding box of the points
+        using them are needed. If these boxes together are not smaller than a single
+        slab of all levels spanned by k, that slab is read instead.
+
+        Args:
+            k (ndarray)     : Index of the level just below depth (2D)
+            valid (ndarray) : False where no value is needed (2D)
+        Returns:
+            boxes (list) : List of (k_lim, y_lim, x_lim) index limits (inclusive) to read
+        """
+        k_valid = k[valid]
+        k_lim = (int(k_valid.min()), int(k_valid.max()) + 1)
+        slab = (k_lim, (0, k.shape[0] - 1), (0, k.shape[1] - 1))
+        boxes = list()
+
+        for k_box in np.unique(k_valid):
+            ys, xs = np.nonzero(valid & (k == k_box))
+            boxes.append(((int(k_box), int(k_box) + 1), (ys.min(), ys.max()), (xs.min(), xs.max())))
+
+        size = lambda box: np.prod([l_2 - l_1 + 1 for l_1, l_2 in box])
+
+        if sum(size(box) for box in boxes) < size(slab):
+            return boxes
+
+        return [slab]
+
+    def interpolate(self, data, k, w, valid):
+        """
+        Method that interpolates a 3D field linearly between the levels k and k + 1.
+
+        Args:
+            data (ndarray)  : 3D array (levels first), may be a subset of the
+                              levels as long as k is relative to that subset
+            k (ndarray)     : Index of the level just below depth (2D)
+            w (ndarray)     : Weight of level k + 1 (2D)
+            valid (ndarray) : False where the result should be NaN (2D)
+        Returns:
+            field (ndarray) : 2D array at constant depth
+        """
+        k = np.clip(k, 0, data.shape[0] - 2)[None]
+        v_below = np.take_along_axis(data, k, axis=0)[0]
+        v_above = np.take_along_axis(data, k + 1, axis=0)[0]
+        field = v_below + w * (v_above - v_below)
+        field[~valid] = np.nan
+        return field
+
+def to_stagger(field, stagger):
+    """
+    Function that averages a 2D rho-point field to u- or v-points.
+
+    Args:
+        field (ndarray) : 2D field at rho-points
+        stagger (str)   : One of "rho", "u", "v"
+    Returns:
+        field (ndarray) : 2D field at the requested points
+    """
+    if stagger == "u":
+        return 0.5 * (field[..., :, :-1] + field[..., :, 1:])
+
+    elif stagger == "v":
+        return 0.5 * (field[..., :-1, :] + field[..., 1:, :])
+
+    return field